@@ -6,71 +6,112 @@ The agent autonomously fetches repos, analyzes code, runs tests, and generates r
 """
 
 from claude_agent_sdk import query, ClaudeAgentOptions
+from .utils import jsonio
 import os
-import json
 import asyncio
-from pathlib import Path
+import functools
 
+# GitHub API responses cached by the agent, shared by all analyses
+_GH_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "gh")
 
-def create_analysis_prompt(username: str, job_desc: str, context: str = "") -> str:
-    """
-    Generate the comprehensive prompt that instructs the agent.
-
-    Args:
-        username: GitHub username to analyze
-        job_desc: Job description with requirements
-        context: Additional context or focus areas
-
-    Returns:
-        Detailed instruction prompt for the agent
-    """
-    # Read the full report template from spec.md if available
-    spec_path = Path(__file__).parent.parent / "spec.md"
+# Agent messages buffered before each debug log write
+DEBUG_LOG_BATCH = 10
 
-    return f"""You are analyzing GitHub profile @{username} for a recruiter.
+# Static instruction template; only the placeholders are filled per analysis
+_PROMPT_TEMPLATE = """You are analyzing GitHub profile @{username} for a recruiter.
 
 JOB DESCRIPTION:
 {job_desc}
 
 ADDITIONAL CONTEXT:
-{context if context else "None provided"}
+{context}
 
 TASK - Complete this analysis autonomously:
 
 1. FETCH REPOSITORIES
-   - Use Bash: curl "https://api.github.com/users/{username}/repos?per_page=100"
+   - First use Write to create ./gh_get.sh, a cached GitHub API GET (successful
+     responses are shared across analyses and reused for 1 hour):
+       #!/bin/sh
+       f="{gh_cache_dir}/$(printf '%s' "$1" | sha256sum | cut -c1-64).json"
+       if [ -z "$(find "$f" -mmin -60 2>/dev/null)" ]; then
+         mkdir -p "{gh_cache_dir}"
+         tmp="$f.tmp.$$"
+         curl -sf -H "Accept: application/vnd.github.mercy-preview+json" \\
+           ${{GITHUB_TOKEN:+-H "Authorization: token $GITHUB_TOKEN"}} "$1" > "$tmp" && mv "$tmp" "$f" || rm -f "$tmp"
+       fi
+       cat "$f"
+   - If $GITHUB_TOKEN is set, fetch everything in ONE GraphQL request instead of
+     the per-repo REST calls below. Use Write to create ./query.json, with "since"
+     set to the ISO timestamp one year ago (date -u -d '1 year ago' +%Y-%m-%dT%H:%M:%SZ):
+       {{"query": "query($login: String!, $since: GitTimestamp!, $cursor: String) {{
+          user(login: $login) {{ repositories(first: 100, after: $cursor, isFork: false,
+            ownerAffiliations: OWNER, orderBy: {{field: PUSHED_AT, direction: DESC}}) {{
+            pageInfo {{ hasNextPage endCursor }}
+            nodes {{ name url description pushedAt updatedAt stargazerCount
+              watchers {{ totalCount }} primaryLanguage {{ name }}
+              languages(first: 10) {{ nodes {{ name }} }}
+              repositoryTopics(first: 10) {{ nodes {{ topic {{ name }} }} }}
+              defaultBranchRef {{ target {{ ... on Commit {{ history(since: $since) {{ totalCount }} }} }} }}
+            }} }} }} }}",
+        "variables": {{"login": "{username}", "since": "<one year ago>"}}}}
+     (shown wrapped for readability - write the query string on ONE line, JSON
+     strings cannot contain newlines)
+     Then: curl -s -H "Authorization: bearer $GITHUB_TOKEN" -X POST https://api.github.com/graphql -d @query.json
+     (if hasNextPage, repeat with "cursor" set to endCursor). This gives languages, topics
+     and past-year commit counts for every repo - use it directly in step 2 and skip
+     the REST calls there.
+   - Otherwise use Bash: sh gh_get.sh "https://api.github.com/users/{username}/repos?per_page=100"
    - If response is paginated, fetch all pages
    - Parse JSON response and save raw data
 
-2. FILTER REPOSITORIES
+2. FILTER REPOSITORIES (GitHub API data only - no working-tree clones in this step)
    Hard filters (MUST exclude):
    - Forks (is_fork = true)
    - Not updated in past 12 months (check updated_at field)
-   - < 5 commits in past year (you'll need to check this after cloning)
+   - < 5 commits in past year (history.totalCount from GraphQL). Without GraphQL,
+     count commits in a bare blobless clone, which downloads no file contents
+     (run from the analysis directory - stay there, the clones go in repos/):
+       mkdir -p repos
+       GIT_TERMINAL_PROMPT=0 git clone --bare --filter=blob:none --no-tags <repo_url> repos/<name>.git
+       git -C repos/<name>.git rev-list --count --since="1 year ago" HEAD
+     Only do this for repos that pass the other filters, and run the clones in
+     parallel with xargs -P 8 as in step 3a.
    - Names containing: tutorial, learning, practice, course, bootcamp
 
    Score remaining repos (0-100):
    - Tech stack match to JD: 70% weight
-     (examine languages_url, topics, description for tech matches)
+     (for each remaining repo: sh gh_get.sh "https://api.github.com/repos/{username}/<name>/languages",
+      plus the topics and description fields already in the repo list)
    - Recency: 20% weight
      (how recently updated)
    - Activity level: 10% weight
      (number of commits, stars, watchers)
 
-   Select top 5 repos with score >= 30
+   Select top 5 repos with score >= 30. Only these get checked out in step 3.
 
 3. ANALYZE EACH SELECTED REPO
-   For each selected repository (up to 5):
-
-   a) Clone it:
+   a) Clone ALL selected repos at once, in parallel (shallow + blobless - much
+      faster than cloning one at a time), from the analysis directory:
       mkdir -p repos
       cd repos
-      git clone --depth 50 <repo_url>
+      REPO_URLS=(<repo_url_1> <repo_url_2> ...)
+      printf '%s\\n' "${{REPO_URLS[@]}}" | GIT_TERMINAL_PROMPT=0 xargs -P 8 -I{{}} git clone --depth 1 --filter=blob:none --single-branch {{}} 2>/dev/null
+      (GIT_TERMINAL_PROMPT=0 makes auth-gated repos fail fast instead of hanging)
+
+      Leave out repos that already have a bare clone (repos/<name>.git) from
+      step 2 - check those out instead (file contents are fetched on demand,
+      and the full history is already there, so skip the deepen step in 3e):
+      git -C <name>.git worktree add ../<name>
+
+   Then, for each selected repository (up to 5), one at a time:
       cd <repo_name>
 
    b) Static analysis FIRST (ALWAYS DO THIS):
-      - Use Glob to find source files: **/*.{{js,ts,py,go,java,rb,php,cs}}
-      - Use Glob to find test files: **/*test*.{{js,ts,py}} or **/test/** directories
+      - Use ONE Glob call to list source and test files together:
+        **/*.{{js,ts,py,go,java,rb,php,cs}}
+        Then split that list yourself: test files are those with "test" or "spec"
+        in the name, or under test/, tests/, __tests__/ or spec/ directories.
+        Do NOT run Glob twice on the same repo - one call, then filter the list.
       - Use Read to examine: README.md, package.json, requirements.txt, go.mod, etc.
       - Assess project organization, code patterns, dependencies, documentation
 
@@ -82,7 +123,9 @@ TASK - Complete this analysis autonomously:
       - Project looks like it has a working setup
 
       If attempting dynamic analysis:
-      - Try: npm install / pip install (2 min timeout)
+      - Start npm install / pip install in the background (`... > install.log 2>&1 &`,
+        2 min timeout) and keep doing static analysis on the other repos meanwhile
+      - Run `wait` before running that repo's tests
       - If install succeeds: try running tests
       - If tests run: capture output (pass/fail, coverage)
       - If anything fails: note it and move on (no big deal)
@@ -101,6 +144,8 @@ TASK - Complete this analysis autonomously:
       - If no tests: focus on code quality and structure instead
 
    e) Git history analysis:
+      - The clone is shallow; only when you need the past year of history, first run:
+        GIT_TERMINAL_PROMPT=0 git fetch --deepen 200 --filter=blob:none
       - git log --oneline --since="1 year ago" --pretty=format:"%h %an %ar %s"
       - Assess commit frequency, message quality, author patterns
       - git shortlog -s -n --since="1 year ago" (contributor breakdown)
@@ -354,6 +399,39 @@ Good luck! Provide a comprehensive, honest, actionable analysis.
 """
 
 
+@functools.lru_cache(maxsize=128)
+def create_analysis_prompt(username: str, job_desc: str, context: str = "") -> str:
+    """
+    Generate the comprehensive prompt that instructs the agent.
+
+    Args:
+        username: GitHub username to analyze
+        job_desc: Job description with requirements
+        context: Additional context or focus areas
+
+    Returns:
+        Detailed instruction prompt for the agent
+    """
+    return _PROMPT_TEMPLATE.format_map({
+        "username": username,
+        "job_desc": job_desc,
+        "context": context or "None provided",
+        "gh_cache_dir": _GH_CACHE_DIR
+    })
+
+
+def _append_log(log, lines: list[str]):
+    """
+    Write a batch of lines to a log file and flush it (blocking).
+
+    Args:
+        log: Open text file
+        lines: Lines to write
+    """
+    log.writelines(lines)
+    log.flush()
+
+
 class GitHubAnalyzer:
     """
     Wrapper for Claude Agent SDK to analyze GitHub profiles.
@@ -373,7 +451,7 @@ class GitHubAnalyzer:
         self.work_dir = f"analyses/{analysis_id}"
         os.makedirs(self.work_dir, exist_ok=True)
 
-    def run(self, username: str, job_desc: str, context: str = "") -> dict:
+    async def run(self, username: str, job_desc: str, context: str = "") -> dict:
         """
         Run the autonomous GitHub analysis.
 
@@ -403,58 +481,78 @@ class GitHubAnalyzer:
             cwd=self.work_dir  # Agent works in this directory
         )
 
+        # Message log lines are batched in memory and written from a worker
+        # thread, so file I/O never blocks the event loop; the log is kept
+        # as debug.txt unless the run succeeds
+        debug_partial = f"{self.work_dir}/debug.txt.partial"
+        debug_log = await asyncio.to_thread(open, debug_partial, "w", encoding="utf-8")
+        pending = []
+        keep_log = True
+        count = 0
+
         try:
-            # Run the agent query asynchronously
-            # We need to collect all messages
-            async def run_query():
-                messages = []
-                async for message in query(prompt=prompt, options=options):
-                    messages.append(message)
-                    print(f"[Agent] Received message type: {type(message).__name__}")
-                return messages
-
-            # Execute the async query
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                messages = loop.run_until_complete(run_query())
-            finally:
-                loop.close()
-
-            print(f"[Agent] Total messages received: {len(messages)}")
+            # Stream agent messages on the caller's event loop
+            async for message in query(prompt=prompt, options=options):
+                pending.append(f"Message {count}: {type(message).__name__} - {str(message)[:200]}\n\n")
+                count += 1
+                print(f"[Agent] Received message type: {type(message).__name__}")
+                if len(pending) >= DEBUG_LOG_BATCH:
+                    await asyncio.to_thread(_append_log, debug_log, pending)
+                    pending = []
+
+            print(f"[Agent] Total messages received: {count}")
 
             # Check if report was actually created
             report_path = f"{self.work_dir}/report.md"
             if not os.path.exists(report_path):
                 # Agent didn't create the report
-                error_msg = f"Agent completed but did not create report.md. Received {len(messages)} messages."
+                error_msg = f"Agent completed but did not create report.md. Received {count} messages."
                 print(f"[Agent ERROR] {error_msg}")
-
-                # Save debug info
-                with open(f"{self.work_dir}/debug.txt", "w", encoding="utf-8") as f:
-                    f.write(f"Messages received: {len(messages)}\n\n")
-                    for i, msg in enumerate(messages):
-                        f.write(f"Message {i}: {type(msg).__name__} - {str(msg)[:200]}\n\n")
-
                 raise Exception(error_msg)
 
+            keep_log = False
+
             return {
                 "analysis_id": self.analysis_id,
                 "status": "completed",
                 "report_path": report_path,
-                "messages": len(messages)
+                "messages": count
             }
 
         except Exception as e:
             # If agent fails, log the error
             error_msg = f"Agent execution failed: {str(e)}"
+            pending.append(f"Messages received: {count}\n")
 
             # Save error to status
-            with open(f"{self.work_dir}/status.json", "w") as f:
-                json.dump({
-                    "stage": "error",
-                    "progress": 0,
-                    "error": error_msg
-                }, f)
+            await asyncio.to_thread(jsonio.dump_atomic, {
+                "stage": "error",
+                "progress": 0,
+                "error": error_msg
+            }, f"{self.work_dir}/status.json")
 
             raise Exception(error_msg)
+
+        finally:
+            # Runs on success, error or cancellation
+            await asyncio.to_thread(self._settle_debug_log, debug_log, pending, keep_log)
+
+    def _settle_debug_log(self, debug_log, pending: list[str], keep: bool):
+        """
+        Flush and close the message log, then keep or discard it (blocking).
+
+        Args:
+            debug_log: Open debug.txt.partial file
+            pending: Log lines not yet written
+            keep: Whether to keep the log as debug.txt
+        """
+        try:
+            debug_log.writelines(pending)
+        finally:
+            debug_log.close()
+
+        debug_partial = f"{self.work_dir}/debug.txt.partial"
+        if keep:
+            os.replace(debug_partial, f"{self.work_dir}/debug.txt")
+        else:
+            os.remove(debug_partial)
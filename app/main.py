@@ -8,15 +8,30 @@ It handles form submission, progress tracking, and report display.
 from fastapi import FastAPI, Form, BackgroundTasks, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from fastapi.exceptions import HTTPException
+import asyncio
+import concurrent.futures
 import uuid
 import json
+import multiprocessing
 import os
+import re
+import time
+import zlib
 from pathlib import Path
 from datetime import datetime
 
 from .agent import GitHubAnalyzer
+from .utils import jsonio
+from .utils.export import export_is_current, generate_pdf, generate_docx
+
+try:
+    from arq import create_pool
+    from arq.connections import RedisSettings
+    ARQ_AVAILABLE = True
+except ImportError:
+    ARQ_AVAILABLE = False
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -29,12 +44,40 @@ app = FastAPI(
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
+# GitHub usernames: alphanumerics and single hyphens, no leading/trailing hyphen, max 39 chars
+_GH_USER_RE = re.compile(r'[A-Za-z0-9](?:[A-Za-z0-9]|-(?=[A-Za-z0-9])){0,38}')
+
+# In-process cache of parsed status files:
+# analysis_id -> (checked_at, (st_ino, st_mtime_ns, st_size), status)
+STATUS_CACHE_TTL = 0.5
+_status_cache: dict[str, tuple[float, tuple[int, int, int], dict]] = {}
+
+# Analyses whose directory is known to exist on disk
+_dirs_created: set[str] = set()
+
+# stat() results for files of completed analyses, which never change: path -> stat
+_completed_stats: dict[str, os.stat_result] = {}
+
+# Exports known to match their report: export path -> _file_key of the
+# report.md they were checked against
+_current_exports: dict[str, tuple[int, int, int]] = {}
+
+# Cap on analyses running at once; extra submissions wait in "queued"
+MAX_PARALLEL_ANALYSES = int(os.getenv("MAX_PARALLEL_ANALYSES", "4"))
+ANALYSIS_SEM = asyncio.Semaphore(MAX_PARALLEL_ANALYSES)
+
+# When set (and arq is installed), analyses run in separate arq worker processes
+REDIS_URL = os.getenv("REDIS_URL", "")
+
 
-def run_analysis_task(analysis_id: str, username: str, job_desc: str, context: str):
+async def run_analysis_task(analysis_id: str, username: str, job_desc: str, context: str):
     """
     Background task to run the agent analysis.
 
-    This function is executed in the background while the user sees progress updates.
+    This coroutine is scheduled on the main event loop, so the agent's
+    network and subprocess waits overlap with request handling. At most
+    MAX_PARALLEL_ANALYSES run at once; the rest report "queued" until a
+    slot frees up.
 
     Args:
         analysis_id: Unique ID for this analysis
@@ -43,25 +86,57 @@ def run_analysis_task(analysis_id: str, username: str, job_desc: str, context: s
         context: Additional context
     """
     try:
-        # Update status to starting
-        update_status(analysis_id, "starting", 0)
+        if ANALYSIS_SEM.locked():
+            await update_status(analysis_id, "queued", 0)
 
-        # Create and run the analyzer
-        analyzer = GitHubAnalyzer(analysis_id)
-        result = analyzer.run(username, job_desc, context)
+        async with ANALYSIS_SEM:
+            # Update status to starting
+            await update_status(analysis_id, "starting", 0)
+
+            # Create and run the analyzer
+            analyzer = GitHubAnalyzer(analysis_id)
+            result = await analyzer.run(username, job_desc, context)
+
+        # Completed reports never change, so render the results page once
+        await asyncio.to_thread(_save_report_page, analysis_id)
 
         # Mark as completed
-        update_status(analysis_id, "completed", 100)
+        await update_status(analysis_id, "completed", 100)
+
+    except asyncio.CancelledError:
+        # Server shutdown or arq job timeout - don't leave the progress page
+        # polling a stage that will never change
+        await update_status(analysis_id, "error", 0, error="Analysis was cancelled")
+        print(f"Analysis {analysis_id} cancelled")
+        raise
 
     except Exception as e:
         # On error, save error status
-        update_status(analysis_id, "error", 0, error=str(e))
+        await update_status(analysis_id, "error", 0, error=str(e))
         print(f"Analysis {analysis_id} failed: {e}")
 
 
-def update_status(analysis_id: str, stage: str, progress: int, **kwargs):
+# Last formatted status timestamp: [epoch seconds, ISO string]
+_LAST_TS = [0.0, ""]
+
+
+def _iso_now_cached() -> str:
+    """
+    Current local time as an ISO string, re-formatted at most every 100ms.
+
+    Returns:
+        ISO 8601 timestamp
     """
-    Update the analysis status file.
+    now = time.time()
+    if now - _LAST_TS[0] > 0.1:
+        _LAST_TS[0] = now
+        _LAST_TS[1] = datetime.fromtimestamp(now).isoformat()
+    return _LAST_TS[1]
+
+
+def _write_status_sync(analysis_id: str, stage: str, progress: int, **kwargs):
+    """
+    Write the analysis status file (blocking).
 
     Args:
         analysis_id: Analysis ID
@@ -72,20 +147,40 @@ def update_status(analysis_id: str, stage: str, progress: int, **kwargs):
     status = {
         "stage": stage,
         "progress": progress,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": _iso_now_cached(),
         **kwargs
     }
 
     status_path = f"analyses/{analysis_id}/status.json"
-    os.makedirs(os.path.dirname(status_path), exist_ok=True)
+    if analysis_id not in _dirs_created:
+        os.makedirs(os.path.dirname(status_path), exist_ok=True)
+        _dirs_created.add(analysis_id)
+
+    jsonio.dump_atomic(status, status_path)
 
-    with open(status_path, "w") as f:
-        json.dump(status, f, indent=2)
+    # Write-through so in-process pollers see the update immediately
+    _status_cache[analysis_id] = (time.monotonic(), _file_key(os.stat(status_path)), status)
 
 
-def get_status(analysis_id: str) -> dict:
+def _file_key(st: os.stat_result) -> tuple[int, int, int]:
     """
-    Get the current status of an analysis.
+    Identify a version of a file from its stat().
+
+    mtime alone is too coarse - two writes in the same timestamp tick look
+    identical - but atomic writes always create a new inode.
+
+    Args:
+        st: stat() result
+
+    Returns:
+        (st_ino, st_mtime_ns, st_size)
+    """
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_status_sync(analysis_id: str) -> dict:
+    """
+    Read the analysis status file (blocking).
 
     Args:
         analysis_id: Analysis ID
@@ -96,8 +191,20 @@ def get_status(analysis_id: str) -> dict:
     status_path = f"analyses/{analysis_id}/status.json"
 
     try:
-        with open(status_path, "r") as f:
-            return json.load(f)
+        for attempt in range(2):
+            with open(status_path, "rb") as f:
+                file_key = _file_key(os.fstat(f.fileno()))
+                data = f.read()
+            try:
+                status = jsonio.loads(data)
+                break
+            except json.JSONDecodeError:
+                # The agent writes status.json non-atomically; retry once
+                if attempt:
+                    raise
+                time.sleep(0.01)
+        _status_cache[analysis_id] = (time.monotonic(), file_key, status)
+        return status
     except FileNotFoundError:
         return {
             "stage": "not_found",
@@ -106,6 +213,176 @@ def get_status(analysis_id: str) -> dict:
         }
 
 
+async def update_status(analysis_id: str, stage: str, progress: int, **kwargs):
+    """
+    Update the analysis status file without blocking the event loop.
+
+    Args:
+        analysis_id: Analysis ID
+        stage: Current stage name
+        progress: Progress percentage (0-100)
+        **kwargs: Additional status fields
+    """
+    await asyncio.to_thread(_write_status_sync, analysis_id, stage, progress, **kwargs)
+
+
+async def get_status(analysis_id: str) -> dict:
+    """
+    Get the current status of an analysis without blocking the event loop.
+
+    Recently read statuses are served from memory. Once the TTL expires, a
+    single stat() decides whether the file changed (the agent also writes
+    status.json from its own process) before falling back to a full read.
+
+    Args:
+        analysis_id: Analysis ID
+
+    Returns:
+        dict with status information
+    """
+    cached = _status_cache.get(analysis_id)
+    if cached:
+        checked_at, file_key, status = cached
+        now = time.monotonic()
+        if now - checked_at < STATUS_CACHE_TTL:
+            return status
+        try:
+            if _file_key(os.stat(f"analyses/{analysis_id}/status.json")) == file_key:
+                _status_cache[analysis_id] = (now, file_key, status)
+                return status
+        except FileNotFoundError:
+            _status_cache.pop(analysis_id, None)
+
+    return await asyncio.to_thread(_read_status_sync, analysis_id)
+
+
+def _completed_file_stat(path: str) -> os.stat_result:
+    """
+    stat() a file belonging to a completed analysis, caching the result.
+
+    Only call this once the analysis is completed - the cached size is
+    handed to FileResponse, so the file must not change afterwards.
+
+    Args:
+        path: File path
+
+    Returns:
+        os.stat_result for the file
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+    """
+    st = _completed_stats.get(path)
+    if st is None:
+        st = os.stat(path)
+        _completed_stats[path] = st
+    return st
+
+
+def _render_report_page(analysis_id: str) -> str:
+    """
+    Render the results page for a completed analysis (blocking).
+
+    Args:
+        analysis_id: Analysis ID
+
+    Returns:
+        Full HTML of the results page
+
+    Raises:
+        FileNotFoundError: If report markdown doesn't exist
+    """
+    report_md = Path(f"analyses/{analysis_id}/report.md").read_text(encoding="utf-8")
+
+    return templates.get_template("results.html").render(
+        analysis_id=analysis_id,
+        report_markdown=report_md
+    )
+
+
+def _save_report_page(analysis_id: str):
+    """
+    Pre-render the results page to analyses/<id>/report.html (blocking).
+
+    Args:
+        analysis_id: Analysis ID
+    """
+    page_path = f"analyses/{analysis_id}/report.html"
+    tmp_path = f"{page_path}.tmp.{os.getpid()}"
+
+    Path(tmp_path).write_text(_render_report_page(analysis_id), encoding="utf-8")
+    os.replace(tmp_path, page_path)
+    _completed_stats[page_path] = os.stat(page_path)
+
+
+@app.on_event("startup")
+async def connect_job_queue():
+    """Connect to the arq job queue if a Redis broker is configured."""
+    app.state.arq = None
+    if ARQ_AVAILABLE and REDIS_URL:
+        app.state.arq = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+
+
+@app.on_event("shutdown")
+async def close_job_queue():
+    """Close the arq connection pool."""
+    if app.state.arq is not None:
+        await app.state.arq.close()
+
+
+@app.on_event("startup")
+async def start_export_pool():
+    """Start the process pool used for CPU-heavy PDF/DOCX generation."""
+    # Forking the server directly would copy it mid-flight with to_thread
+    # worker threads running; forkserver is unavailable on Windows, so fall
+    # back to spawn there
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    app.state.export_pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context(start_method)
+    )
+
+
+@app.on_event("shutdown")
+async def stop_export_pool():
+    """Shut down the export process pool."""
+    app.state.export_pool.shutdown(cancel_futures=True)
+
+
+async def _export(generate, analysis_id: str, extension: str) -> str:
+    """
+    Return an up-to-date export of the report, generating it if needed.
+
+    A repeat export of an unchanged report.md costs one stat(). When the
+    report's stat changes, its content hash is checked against the
+    export's sidecar here, and only real rebuilds go to the export process
+    pool so they don't hold the GIL of the server process.
+
+    Args:
+        generate: generate_pdf or generate_docx
+        analysis_id: Analysis ID
+        extension: Export file extension ("pdf" or "docx")
+
+    Returns:
+        Path to the exported file
+
+    Raises:
+        FileNotFoundError: If report markdown doesn't exist
+    """
+    report_path = f"analyses/{analysis_id}/report.md"
+    export_path = f"analyses/{analysis_id}/report.{extension}"
+
+    report_key = _file_key(os.stat(report_path))
+
+    if _current_exports.get(export_path) != report_key:
+        if not await asyncio.to_thread(export_is_current, report_path, export_path):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(app.state.export_pool, generate, analysis_id)
+        _current_exports[export_path] = report_key
+
+    return export_path
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """
@@ -138,8 +415,8 @@ async def start_analysis(
     Returns:
         JSON with analysis_id and redirect_url
     """
-    # Validate username (basic check)
-    if not username.replace("-", "").replace("_", "").isalnum():
+    # Validate username against GitHub's username rules
+    if not username or not _GH_USER_RE.fullmatch(username):
         raise HTTPException(
             status_code=400,
             detail="Invalid GitHub username format"
@@ -150,15 +427,27 @@ async def start_analysis(
 
     # Create analysis directory
     os.makedirs(f"analyses/{analysis_id}", exist_ok=True)
-
-    # Start analysis in background
-    background_tasks.add_task(
-        run_analysis_task,
-        analysis_id,
-        username,
-        job_description,
-        additional_context
-    )
+    _dirs_created.add(analysis_id)
+
+    if app.state.arq is not None:
+        # Hand off to an arq worker process
+        await update_status(analysis_id, "queued", 0)
+        await app.state.arq.enqueue_job(
+            "analyze_job",
+            analysis_id,
+            username,
+            job_description,
+            additional_context
+        )
+    else:
+        # Start analysis in background
+        background_tasks.add_task(
+            run_analysis_task,
+            analysis_id,
+            username,
+            job_description,
+            additional_context
+        )
 
     return JSONResponse({
         "analysis_id": analysis_id,
@@ -167,17 +456,29 @@ async def start_analysis(
 
 
 @app.get("/status/{analysis_id}")
-async def check_status(analysis_id: str):
+async def check_status(analysis_id: str, request: Request):
     """
     Check the status of an analysis (for polling).
 
+    Responses carry an ETag built from the whole status, so polls that
+    find nothing new get an empty 304.
+
     Args:
         analysis_id: Analysis ID
+        request: FastAPI request
 
     Returns:
-        JSON with current status
+        JSON with current status, or 304 Not Modified
     """
-    return get_status(analysis_id)
+    status = await get_status(analysis_id)
+
+    etag = f'W/"{zlib.crc32(jsonio.dumps(status)):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(status, headers=headers)
 
 
 @app.get("/results/{analysis_id}", response_class=HTMLResponse)
@@ -195,21 +496,30 @@ async def show_results(analysis_id: str, request: Request):
     Returns:
         HTML template (either progress or results)
     """
-    status = get_status(analysis_id)
+    status = await get_status(analysis_id)
 
     if status["stage"] == "completed":
-        # Analysis complete - load and show report
-        report_path = f"analyses/{analysis_id}/report.md"
+        # Analysis complete - serve the pre-rendered report page
+        page_path = f"analyses/{analysis_id}/report.html"
 
         try:
-            with open(report_path, "r", encoding="utf-8") as f:
-                report_md = f.read()
+            page_stat = _completed_file_stat(page_path)
+        except FileNotFoundError:
+            page_stat = None
+
+        if page_stat is not None:
+            return FileResponse(
+                page_path,
+                media_type="text/html",
+                headers={"Cache-Control": "public, max-age=3600, immutable"},
+                stat_result=page_stat
+            )
 
-            return templates.TemplateResponse("results.html", {
-                "request": request,
-                "analysis_id": analysis_id,
-                "report_markdown": report_md
-            })
+        # Not pre-rendered yet (the agent can mark itself completed before
+        # the background task finishes) - render on the fly
+        try:
+            page = await asyncio.to_thread(_render_report_page, analysis_id)
+            return HTMLResponse(page)
 
         except FileNotFoundError:
             raise HTTPException(
@@ -245,10 +555,8 @@ async def export_pdf(analysis_id: str):
     Returns:
         PDF file download
     """
-    from .utils.export import generate_pdf
-
     try:
-        pdf_path = generate_pdf(analysis_id)
+        pdf_path = await _export(generate_pdf, analysis_id, "pdf")
 
         return FileResponse(
             pdf_path,
@@ -279,10 +587,8 @@ async def export_docx(analysis_id: str):
     Returns:
         Word document download
     """
-    from .utils.export import generate_docx
-
     try:
-        docx_path = generate_docx(analysis_id)
+        docx_path = await _export(generate_docx, analysis_id, "docx")
 
         return FileResponse(
             docx_path,
@@ -315,16 +621,28 @@ async def export_markdown(analysis_id: str):
     """
     report_path = f"analyses/{analysis_id}/report.md"
 
-    if not os.path.exists(report_path):
+    # A completed analysis always has its report on disk
+    status = await get_status(analysis_id)
+    if status["stage"] != "completed":
+        raise HTTPException(
+            status_code=404,
+            detail="Report not found"
+        )
+
+    try:
+        report_stat = _completed_file_stat(report_path)
+    except FileNotFoundError:
         raise HTTPException(
             status_code=404,
             detail="Report not found"
         )
 
+    # Passing the cached stat lets Starlette skip its own stat() per download
     return FileResponse(
         report_path,
         media_type="text/markdown",
-        filename=f"github_analysis_{analysis_id[:8]}.md"
+        filename=f"github_analysis_{analysis_id[:8]}.md",
+        stat_result=report_stat
     )
 
 
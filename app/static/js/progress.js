@@ -71,6 +71,11 @@ function startProgressPolling(analysisId) {
         let icon = '⏳';
 
         switch(status.stage) {
+            case 'queued':
+                message = 'Waiting for a free analysis slot...';
+                icon = '🕒';
+                break;
+
             case 'starting':
                 message = 'Initializing analysis...';
                 icon = '🚀';
@@ -123,6 +128,7 @@ function startProgressPolling(analysisId) {
     function updateStepIndicators(status) {
         const steps = ['step1', 'step2', 'step3', 'step4'];
         const stageToStep = {
+            'queued': 0,
             'starting': 0,
             'fetching_repos': 0,
             'filtering_repos': 1,
@@ -3,23 +3,324 @@ Export utilities for generating PDF and Word documents from markdown reports.
 """
 
 from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from reportlab.lib.pagesizes import letter, A4
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Pt, RGBColor
+from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 
-import markdown
+import hashlib
 import os
 import re
+import threading
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# Inline markdown converted in PDFs (bold | code), matched in a single pass;
+# single '*' is left alone so text like "2 * 3 * 4" isn't italicised
+_INLINE_RE = re.compile(r'\*\*(.*?)\*\*|`(.*?)`')
+_OL_RE = re.compile(r'^\d+\. ')
+
+# Block-level line prefixes -> (block kind, prefix length). Looked up by
+# _block_prefix using the line's first 4, then 3, then 2 characters.
+_BLOCK_PREFIXES = {
+    '### ': ('heading3', 4),
+    '## ': ('heading2', 3),
+    '# ': ('heading1', 2),
+    '---': ('rule', 3),
+    '***': ('rule', 3),
+    '```': ('code', 3),
+    '- ': ('bullet', 2),
+    '* ': ('bullet', 2),
+}
+
+# ReportLab markup for each _INLINE_RE group
+_PDF_INLINE_TAGS = {
+    1: ('<b>', '</b>'),
+    2: ('<font name="Courier">', '</font>'),
+}
+
+
+# PDF paragraph styles, built once and shared by every export
+_PDF_STYLES = getSampleStyleSheet()
+
+_PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_PDF_STYLES['Heading1'],
+    fontSize=18,
+    textColor='#1a1a1a',
+    spaceAfter=12
+)
+
+_PDF_HEADING2_STYLE = ParagraphStyle(
+    'CustomHeading2',
+    parent=_PDF_STYLES['Heading2'],
+    fontSize=14,
+    textColor='#2c3e50',
+    spaceAfter=10,
+    spaceBefore=10
+)
+
+_PDF_HEADING3_STYLE = ParagraphStyle(
+    'CustomHeading3',
+    parent=_PDF_STYLES['Heading3'],
+    fontSize=12,
+    textColor='#34495e',
+    spaceAfter=8,
+    spaceBefore=8
+)
+
+_PDF_BODY_STYLE = ParagraphStyle(
+    'CustomBody',
+    parent=_PDF_STYLES['BodyText'],
+    fontSize=10,
+    leading=14
+)
+
+_PDF_HEADING_STYLES = {
+    'heading1': _PDF_TITLE_STYLE,
+    'heading2': _PDF_HEADING2_STYLE,
+    'heading3': _PDF_HEADING3_STYLE,
+}
+
+
+# DOCX heading style colors: (level, (r, g, b))
+_DOCX_HEADING_COLORS = [(1, (26, 26, 26)), (2, (44, 62, 80)), (3, (52, 73, 94))]
+
+# DOCX paragraph XML per block type; {runs} is the output of _docx_runs
+_DOCX_PARAGRAPH_XML = {
+    'heading1': '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r>{runs}</w:r></w:p>',
+    'heading2': '<w:p><w:pPr><w:pStyle w:val="Heading2"/></w:pPr><w:r>{runs}</w:r></w:p>',
+    'heading3': '<w:p><w:pPr><w:pStyle w:val="Heading3"/></w:pPr><w:r>{runs}</w:r></w:p>',
+    'bullet': '<w:p><w:pPr><w:pStyle w:val="ListBullet"/></w:pPr><w:r>{runs}</w:r></w:p>',
+    'number': '<w:p><w:pPr><w:pStyle w:val="ListNumber"/></w:pPr><w:r>{runs}</w:r></w:p>',
+    'code': (
+        '<w:p><w:r><w:rPr><w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/>'
+        '<w:sz w:val="18"/></w:rPr>{runs}</w:r></w:p>'
+    ),
+    'normal': '<w:p><w:r>{runs}</w:r></w:p>',
+}
+
+
+def _docx_runs(text: str) -> str:
+    """
+    Convert text to run content XML, like python-docx's Run.text setter.
+
+    Args:
+        text: Plain text (may contain newlines and tabs)
+
+    Returns:
+        XML for the inside of a <w:r> element
+    """
+    parts = []
+    for i, line in enumerate(text.split('\n')):
+        if i:
+            parts.append('<w:br/>')
+        for j, chunk in enumerate(line.split('\t')):
+            if j:
+                parts.append('<w:tab/>')
+            if chunk:
+                parts.append(f'<w:t xml:space="preserve">{escape(chunk)}</w:t>')
+    return ''.join(parts)
+
+
+def _docx_template() -> bytes:
+    """
+    Build the base Word document every export starts from.
+
+    Returns:
+        .docx bytes with the Normal font and heading colors configured
+    """
+    doc = Document()
+
+    # Set default font
+    font = doc.styles['Normal'].font
+    font.name = 'Calibri'
+    font.size = Pt(11)
+
+    # Heading colors
+    for level, rgb in _DOCX_HEADING_COLORS:
+        doc.styles[f'Heading {level}'].font.color.rgb = RGBColor(*rgb)
+
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+# Styled base document, built once at import instead of per export
+_DOCX_TEMPLATE = _docx_template()
+
+
+def _block_prefix(line: str) -> tuple:
+    """
+    Classify a markdown line by its block-level prefix.
+
+    Args:
+        line: Line of markdown
+
+    Returns:
+        (block kind, prefix length), or (None, 0) for other lines
+    """
+    return (
+        _BLOCK_PREFIXES.get(line[:4])
+        or _BLOCK_PREFIXES.get(line[:3])
+        or _BLOCK_PREFIXES.get(line[:2])
+        or (None, 0)
+    )
+
+
+def _strip_inline(text: str) -> str:
+    """
+    Remove bold, italic and inline-code markers from a line.
+
+    Walks the string with str.find instead of the regex engine, and returns
+    lines without markers untouched. Bold and italic spans are stripped
+    recursively, so code nested inside them (**`x`**) loses its backticks
+    too.
+
+    Args:
+        text: Line of markdown
+
+    Returns:
+        Line with the markers removed
+    """
+    if '*' not in text and '`' not in text:
+        return text
+
+    out = []
+    pos = 0
+    while True:
+        star = text.find('*', pos)
+        tick = text.find('`', pos)
+        if star == -1 and tick == -1:
+            break
+        start = tick if star == -1 or (tick != -1 and tick < star) else star
+
+        if text[start] == '*':
+            # Bold takes precedence, then italic
+            if text.startswith('**', start):
+                end = text.find('**', start + 2)
+                if end != -1:
+                    out.append(text[pos:start])
+                    out.append(_strip_inline(text[start + 2:end]))
+                    pos = end + 2
+                    continue
+            end = text.find('*', start + 1)
+        else:
+            end = text.find('`', start + 1)
+
+        if end == -1:
+            # Unmatched marker - keep it and look further along
+            out.append(text[pos:start + 1])
+            pos = start + 1
+            continue
+
+        inner = text[start + 1:end]
+        out.append(text[pos:start])
+        out.append(_strip_inline(inner) if text[start] == '*' else inner)
+        pos = end + 1
+
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def _inline_pdf(m: re.Match) -> str:
+    """_INLINE_RE callback that converts the markers to ReportLab markup."""
+    open_tag, close_tag = _PDF_INLINE_TAGS[m.lastindex]
+    inner = m.group(m.lastindex)
+    if m.lastindex == 1:
+        # Convert code nested in bold (**`x`**)
+        inner = _pdf_markup(inner)
+    return f"{open_tag}{inner}{close_tag}"
+
+
+def _pdf_markup(text: str) -> str:
+    """
+    Convert bold and inline-code markers to ReportLab markup.
+
+    Lines without a '*' or '`' are returned untouched without entering the
+    regex engine.
+
+    Args:
+        text: Line of markdown
+
+    Returns:
+        Line with ReportLab markup
+    """
+    if '*' not in text and '`' not in text:
+        return text
+    return _INLINE_RE.sub(_inline_pdf, text)
+
+
+def _cached(path: str, content_hash: str, build_fn) -> str:
+    """
+    Return an export, rebuilding it only when the report content changed.
+
+    The hash of the markdown each export was built from is kept next to
+    it in a "<path>.sha" sidecar file.
+
+    Args:
+        path: Export file path
+        content_hash: Hash of the current markdown
+        build_fn: Callable that (re)builds the export at path
+
+    Returns:
+        path
+    """
+    sha_path = f"{path}.sha"
+
+    try:
+        with open(sha_path, "r") as f:
+            if f.read() == content_hash and os.path.exists(path):
+                return path
+    except FileNotFoundError:
+        pass
+
+    build_fn()
+
+    with open(sha_path, "w") as f:
+        f.write(content_hash)
+
+    return path
+
+
+def _content_hash(md_bytes: bytes) -> str:
+    """Hash report markdown for export memoization."""
+    return hashlib.blake2b(md_bytes, digest_size=16).hexdigest()
+
+
+def export_is_current(report_path: str, export_path: str) -> bool:
+    """
+    Check whether an export was built from the report's current content.
+
+    Args:
+        report_path: Report markdown path
+        export_path: Export file path
+
+    Returns:
+        True if the export exists and matches the report
+
+    Raises:
+        FileNotFoundError: If report markdown doesn't exist
+    """
+    content_hash = _content_hash(Path(report_path).read_bytes())
+
+    try:
+        with open(f"{export_path}.sha", "r") as f:
+            return f.read() == content_hash and os.path.exists(export_path)
+    except FileNotFoundError:
+        return False
 
 
 def generate_pdf(analysis_id: str) -> str:
     """
     Generate a styled PDF from the markdown report using ReportLab.
 
+    Reuses the existing PDF if the report hasn't changed since it was built.
+
     Args:
         analysis_id: Analysis ID
 
@@ -32,95 +333,77 @@ def generate_pdf(analysis_id: str) -> str:
     report_path = f"analyses/{analysis_id}/report.md"
     pdf_path = f"analyses/{analysis_id}/report.pdf"
 
-    # Read markdown content
-    with open(report_path, "r", encoding="utf-8") as f:
-        md_content = f.read()
+    md_bytes = Path(report_path).read_bytes()
 
-    # Create PDF document
-    doc = SimpleDocTemplate(pdf_path, pagesize=A4, topMargin=0.75*inch, bottomMargin=0.75*inch)
-    story = []
-
-    # Define styles
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor='#1a1a1a',
-        spaceAfter=12
+    return _cached(
+        pdf_path,
+        _content_hash(md_bytes),
+        lambda: _build_pdf(md_bytes.decode("utf-8"), pdf_path)
     )
 
-    heading2_style = ParagraphStyle(
-        'CustomHeading2',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor='#2c3e50',
-        spaceAfter=10,
-        spaceBefore=10
-    )
 
-    heading3_style = ParagraphStyle(
-        'CustomHeading3',
-        parent=styles['Heading3'],
-        fontSize=12,
-        textColor='#34495e',
-        spaceAfter=8,
-        spaceBefore=8
-    )
+def _build_pdf(md_content: str, pdf_path: str):
+    """
+    Render markdown to a PDF file.
 
-    body_style = styles['BodyText']
-    body_style.fontSize = 10
-    body_style.leading = 14
+    Args:
+        md_content: Report markdown
+        pdf_path: Output path
+    """
+    story = []
 
     # Parse markdown line by line
-    lines = md_content.split('\n')
-
-    for line in lines:
+    for line in md_content.splitlines():
         line = line.strip()
 
         if not line:
             story.append(Spacer(1, 0.1*inch))
             continue
 
+        kind, prefix_len = _block_prefix(line)
+
         # Headers
-        if line.startswith('# '):
-            text = line[2:].strip()
-            story.append(Paragraph(text, title_style))
-        elif line.startswith('## '):
-            text = line[3:].strip()
-            story.append(Paragraph(text, heading2_style))
-        elif line.startswith('### '):
-            text = line[4:].strip()
-            story.append(Paragraph(text, heading3_style))
+        if kind in _PDF_HEADING_STYLES:
+            text = line[prefix_len:].strip()
+            story.append(Paragraph(text, _PDF_HEADING_STYLES[kind]))
         # Horizontal rules
-        elif line.startswith('---') or line.startswith('***'):
+        elif kind == 'rule':
             story.append(Spacer(1, 0.2*inch))
         # Lists
-        elif line.startswith('- ') or line.startswith('* '):
+        elif kind == 'bullet':
             text = line[2:].strip()
-            # Remove markdown formatting
-            text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
-            text = re.sub(r'`(.*?)`', r'<font name="Courier">\1</font>', text)
-            story.append(Paragraph(f"• {text}", body_style))
-        # Regular text
+            # Convert markdown formatting
+            text = _pdf_markup(text)
+            story.append(Paragraph(f"• {text}", _PDF_BODY_STYLE))
+        # Regular text (code fences included - the PDF has no code blocks)
         else:
-            # Remove/convert markdown formatting
-            text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', line)
-            text = re.sub(r'`(.*?)`', r'<font name="Courier">\1</font>', text)
-            story.append(Paragraph(text, body_style))
-
-    # Build PDF
-    doc.build(story)
-
-    return pdf_path
+            # Convert markdown formatting
+            text = _pdf_markup(line)
+            story.append(Paragraph(text, _PDF_BODY_STYLE))
+
+    # Build PDF into a temp file, with page streams compressed regardless of
+    # the global rl_config default, then swap it in so a download already
+    # streaming the old export never sees a truncated file
+    tmp_path = f"{pdf_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        doc = SimpleDocTemplate(
+            f,
+            pagesize=A4,
+            topMargin=0.75*inch,
+            bottomMargin=0.75*inch,
+            pageCompression=1
+        )
+        doc.build(story)
+    os.replace(tmp_path, pdf_path)
 
 
 def generate_docx(analysis_id: str) -> str:
     """
     Generate a Word document from the markdown report.
 
+    Reuses the existing document if the report hasn't changed since it
+    was built.
+
     Args:
         analysis_id: Analysis ID
 
@@ -133,97 +416,95 @@ def generate_docx(analysis_id: str) -> str:
     report_path = f"analyses/{analysis_id}/report.md"
     docx_path = f"analyses/{analysis_id}/report.docx"
 
-    # Read markdown content
-    with open(report_path, "r", encoding="utf-8") as f:
-        md_content = f.read()
+    md_bytes = Path(report_path).read_bytes()
 
-    # Create Document
-    doc = Document()
+    return _cached(
+        docx_path,
+        _content_hash(md_bytes),
+        lambda: _build_docx(md_bytes.decode("utf-8"), docx_path)
+    )
 
-    # Set default font
-    style = doc.styles['Normal']
-    font = style.font
-    font.name = 'Calibri'
-    font.size = Pt(11)
 
-    # Parse markdown line by line (basic parser)
-    lines = md_content.split('\n')
+def _build_docx(md_content: str, docx_path: str):
+    """
+    Render markdown to a Word document.
+
+    Args:
+        md_content: Report markdown
+        docx_path: Output path
+    """
+    # Create Document from the pre-styled template
+    doc = Document(BytesIO(_DOCX_TEMPLATE))
+
+    # Parse markdown line by line (basic parser) into paragraph XML; code
+    # blocks jump the index past their closing fence
+    lines = md_content.splitlines()
+    paragraphs = []
     i = 0
 
     while i < len(lines):
         line = lines[i]
+        i += 1
 
         # Skip empty lines
         if not line.strip():
-            i += 1
             continue
 
-        # Heading 1
-        if line.startswith('# '):
-            heading = doc.add_heading(line[2:].strip(), level=1)
-            heading.style.font.color.rgb = RGBColor(26, 26, 26)
-
-        # Heading 2
-        elif line.startswith('## '):
-            heading = doc.add_heading(line[3:].strip(), level=2)
-            heading.style.font.color.rgb = RGBColor(44, 62, 80)
+        kind, prefix_len = _block_prefix(line)
 
-        # Heading 3
-        elif line.startswith('### '):
-            heading = doc.add_heading(line[4:].strip(), level=3)
-            heading.style.font.color.rgb = RGBColor(52, 73, 94)
+        # Headings
+        if kind in ('heading1', 'heading2', 'heading3'):
+            text = line[prefix_len:].strip()
 
         # Horizontal rule
-        elif line.startswith('---') or line.startswith('***'):
-            doc.add_paragraph('_' * 60)
+        elif kind == 'rule':
+            kind, text = 'normal', '_' * 60
 
         # Unordered list
-        elif line.startswith('- ') or line.startswith('* '):
+        elif kind == 'bullet':
             text = line[2:].strip()
             # Remove markdown formatting
-            text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-            text = re.sub(r'\*(.*?)\*', r'\1', text)  # Italic
-            text = re.sub(r'`(.*?)`', r'\1', text)  # Code
-            doc.add_paragraph(text, style='List Bullet')
-
-        # Ordered list
-        elif re.match(r'^\d+\. ', line):
-            text = re.sub(r'^\d+\. ', '', line).strip()
-            # Remove markdown formatting
-            text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-            text = re.sub(r'\*(.*?)\*', r'\1', text)
-            text = re.sub(r'`(.*?)`', r'\1', text)
-            doc.add_paragraph(text, style='List Number')
+            text = _strip_inline(text)
 
         # Code block
-        elif line.startswith('```'):
-            code_lines = []
-            i += 1
-            while i < len(lines) and not lines[i].startswith('```'):
-                code_lines.append(lines[i])
-                i += 1
-            code_text = '\n'.join(code_lines)
-            p = doc.add_paragraph(code_text)
-            p.style.font.name = 'Courier New'
-            p.style.font.size = Pt(9)
+        elif kind == 'code':
+            # Find the closing fence (an unclosed block runs to the end)
+            end = i
+            while end < len(lines) and not lines[end].startswith('```'):
+                end += 1
+            text = '\n'.join(lines[i:end])
+            i = end + 1
+
+        # Ordered list (the digit check keeps most lines out of the regex)
+        elif line[:1].isdigit() and _OL_RE.match(line):
+            text = _OL_RE.sub('', line).strip()
+            # Remove markdown formatting
+            kind, text = 'number', _strip_inline(text)
 
         # Regular paragraph
         else:
-            # Remove markdown formatting while adding to doc
-            text = line
-
-            # Simple bold and italic handling
-            text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-            text = re.sub(r'\*(.*?)\*', r'\1', text)
-            text = re.sub(r'`(.*?)`', r'\1', text)
-
-            # Add paragraph
-            if text.strip():
-                doc.add_paragraph(text.strip())
-
-        i += 1
-
-    # Save document
-    doc.save(docx_path)
-
-    return docx_path
+            # Simple bold, italic and code handling
+            text = _strip_inline(line).strip()
+            if not text:
+                continue
+            kind = 'normal'
+
+        paragraphs.append(_DOCX_PARAGRAPH_XML[kind].format(runs=_docx_runs(text)))
+
+    # Parse all paragraphs at once and splice them in ahead of the section properties
+    parsed = parse_xml(f'<w:body {nsdecls("w")}>{"".join(paragraphs)}</w:body>')
+    body = doc.element.body
+    sect_pr = body.sectPr
+    body.extend(list(parsed))
+    if sect_pr is not None:
+        body.append(sect_pr)  # section properties must stay last
+
+    # Save to memory, then swap the file in so readers never see a partial
+    # export
+    buf = BytesIO()
+    doc.save(buf)
+
+    tmp_path = f"{docx_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(buf.getvalue())
+    os.replace(tmp_path, docx_path)
@@ -0,0 +1,64 @@
+"""
+JSON helpers for status files, using orjson when it is installed.
+"""
+
+import os
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+
+def dumps(obj) -> bytes:
+    """
+    Serialize an object to indented UTF-8 JSON bytes.
+
+    Args:
+        obj: JSON-serializable object
+
+    Returns:
+        Encoded JSON
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def loads(data: bytes):
+    """
+    Parse JSON from bytes or str.
+
+    Args:
+        data: Encoded JSON
+
+    Returns:
+        Decoded object
+
+    Raises:
+        json.JSONDecodeError: If the data is not valid JSON
+            (orjson.JSONDecodeError subclasses it)
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_atomic(obj, path: str):
+    """
+    Write an object as JSON so readers never see a partial file.
+
+    The data goes to a temp file in the same directory which is then
+    renamed over the target. No fsync - status files are derived state.
+
+    Args:
+        obj: JSON-serializable object
+        path: Destination file path
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(dumps(obj))
+    os.replace(tmp_path, path)
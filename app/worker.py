@@ -0,0 +1,36 @@
+"""
+arq worker for running analyses outside the web process.
+
+Start one or more workers from the project root with:
+    REDIS_URL=redis://localhost:6379 arq app.worker.WorkerSettings
+
+The web app enqueues jobs here instead of using FastAPI background tasks
+whenever REDIS_URL is set.
+"""
+
+from arq.connections import RedisSettings
+
+from .main import run_analysis_task, MAX_PARALLEL_ANALYSES, REDIS_URL
+
+
+async def analyze_job(ctx, analysis_id: str, username: str, job_desc: str, context: str):
+    """
+    arq job wrapper around the analysis task.
+
+    Args:
+        ctx: arq job context
+        analysis_id: Unique ID for this analysis
+        username: GitHub username
+        job_desc: Job description
+        context: Additional context
+    """
+    await run_analysis_task(analysis_id, username, job_desc, context)
+
+
+class WorkerSettings:
+    """arq worker configuration."""
+
+    functions = [analyze_job]
+    redis_settings = RedisSettings.from_dsn(REDIS_URL or "redis://localhost:6379")
+    max_jobs = MAX_PARALLEL_ANALYSES
+    job_timeout = 30 * 60  # analyses take 5-15 minutes